@@ -1,15 +1,40 @@
 import asyncio
-import json
+import orjson
+import time
 import uuid
+from collections import deque
 from typing import Any, Optional
 import websockets
 from websockets.server import WebSocketServerProtocol
 
 
 class Context:
+    # Requests submitted within BATCH_WINDOW seconds of each other are sent to the
+    # extension as a single {"batch": [...]} frame of at most MAX_BATCH messages,
+    # once the extension has advertised the "batch" capability. Until then each
+    # request is written straight to the socket.
+    BATCH_WINDOW = 0.002
+    MAX_BATCH = 16
+    # How long a tool call waits for the extension to (re)connect before failing
+    RECONNECT_GRACE = 5.0
+    # An identical tool call made LOOP_THRESHOLD times within LOOP_WINDOW seconds
+    # whose latest attempt failed is short-circuited with that error instead of
+    # being retried against the extension.
+    LOOP_WINDOW = 5.0
+    LOOP_THRESHOLD = 3
+
     def __init__(self):
         self._ws: Optional[WebSocketServerProtocol] = None
         self._pending_requests: dict[str, asyncio.Future] = {}
+        # Connection each in-flight request was written to
+        self._sent_on: dict[str, WebSocketServerProtocol] = {}
+        self._outgoing: deque[dict] = deque()
+        self._outgoing_ready: Optional[asyncio.Future] = None
+        self._writer_task: Optional[asyncio.Task] = None
+        self._connected = asyncio.Event()
+        self._supports_batch = False
+        # (timestamp, call key, error message or None) for recent tool calls
+        self._recent_calls: deque[tuple[float, int, Optional[str]]] = deque(maxlen=64)
 
     @property
     def ws(self) -> WebSocketServerProtocol:
@@ -24,55 +49,191 @@ class Context:
         # resulting in a connection-churn loop. Let the client decide when to
         # disconnect instead.
         self._ws = ws
+        # Capabilities are per connection; wait for this one to advertise them
+        self._supports_batch = False
+        self._connected.set()
+
+    def set_capabilities(self, capabilities: list):
+        """Record the capabilities the extension advertised in its hello message."""
+        self._supports_batch = "batch" in capabilities
+
+    def clear_ws(self, ws: WebSocketServerProtocol):
+        """Forget a WebSocket connection that has closed.
+
+        Requests still waiting in the outgoing queue are kept and sent once the
+        extension reconnects. Requests already sent on the closed connection can
+        never be answered, so they fail immediately instead of timing out, even
+        if the extension has already reconnected on a new connection.
+        """
+        if self._ws is ws:
+            self._ws = None
+            self._connected.clear()
+
+        for message_id, sent_on in list(self._sent_on.items()):
+            future = self._pending_requests.get(message_id)
+            if sent_on is ws and future and not future.done():
+                future.set_exception(Exception("Connection to browser extension lost"))
 
     def has_ws(self) -> bool:
         """Check if we have an active WebSocket connection."""
         return self._ws is not None
 
-    async def send_socket_message(self, message_type: str, payload: dict = None, timeout: float = 30.0) -> Any:
-        """Send a message to the browser extension and wait for response."""
+    def submit(self, message_type: str, payload: dict = None) -> asyncio.Future:
+        """Queue a message for the browser extension and return a future for its response."""
+        message, future = self._register(message_type, payload)
+        self._enqueue(message)
+        return future
+
+    def _register(self, message_type: str, payload: dict = None) -> tuple[dict, asyncio.Future]:
+        """Create a message and the future its response will resolve."""
         if not self.has_ws():
             raise Exception("No connection to browser extension. Please connect your browser extension first.")
-        
+
         message_id = str(uuid.uuid4())
-        message = {
+        future = asyncio.get_running_loop().create_future()
+        self._pending_requests[message_id] = future
+        future.add_done_callback(lambda _: self._forget(message_id))
+        return {
             "id": message_id,
             "type": message_type,
             "payload": payload or {}
-        }
-        
-        # Create future for response
-        future = asyncio.Future()
-        self._pending_requests[message_id] = future
-        
+        }, future
+
+    def _enqueue(self, message: dict):
+        """Hand a message to the batch writer."""
+        if self._writer_task is None or self._writer_task.done():
+            self._writer_task = asyncio.create_task(self._write_batches())
+
+        self._outgoing.append(message)
+        # Wake the writer only if it is parked waiting for work
+        if self._outgoing_ready and not self._outgoing_ready.done():
+            self._outgoing_ready.set_result(None)
+
+    def _forget(self, message_id: str):
+        self._pending_requests.pop(message_id, None)
+        self._sent_on.pop(message_id, None)
+
+    async def _send_frame(self, ws: WebSocketServerProtocol, frame: dict, messages: list[dict]) -> bool:
+        """Write one frame carrying messages; return False if the connection is closed."""
+        for message in messages:
+            self._sent_on[message["id"]] = ws
+        try:
+            # Decode to str so the extension still receives a text frame
+            await ws.send(orjson.dumps(frame).decode())
+        except websockets.exceptions.ConnectionClosed:
+            for message in messages:
+                self._sent_on.pop(message["id"], None)
+            return False
+        except Exception as e:
+            for message in messages:
+                future = self._pending_requests.get(message["id"])
+                if future and not future.done():
+                    future.set_exception(e)
+        return True
+
+    async def _write_batches(self):
+        """Coalesce queued messages into as few WebSocket frames as possible."""
+        while True:
+            if not self._outgoing:
+                self._outgoing_ready = asyncio.get_running_loop().create_future()
+                await self._outgoing_ready
+            # Hold queued requests while the extension reconnects
+            await self._connected.wait()
+            if self._supports_batch:
+                await asyncio.sleep(self.BATCH_WINDOW)
+            batch = [self._outgoing.popleft() for _ in range(min(len(self._outgoing), self.MAX_BATCH))]
+            # Drop requests whose caller has already given up (e.g. timed out)
+            batch = [message for message in batch if message["id"] in self._pending_requests]
+            if not batch:
+                continue
+
+            ws = self._ws
+            if ws is None:
+                self._outgoing.extendleft(reversed(batch))
+                continue
+
+            # Extensions without the "batch" capability get one frame per
+            # message; a lone message always keeps the plain frame format
+            if self._supports_batch and len(batch) > 1:
+                groups = [batch]
+                frames = [{"batch": batch}]
+            else:
+                groups = [[message] for message in batch]
+                frames = batch
+
+            for index, frame in enumerate(frames):
+                if not await self._send_frame(ws, frame, groups[index]):
+                    # Never delivered: requeue for the next connection
+                    unsent = [message for group in groups[index:] for message in group]
+                    self._outgoing.extendleft(reversed(unsent))
+                    self.clear_ws(ws)
+                    break
+
+    async def send_socket_message(self, message_type: str, payload: dict = None, timeout: float = 30.0) -> Any:
+        """Send a message to the browser extension and wait for response."""
+        if not self.has_ws():
+            try:
+                await asyncio.wait_for(self._connected.wait(), timeout=self.RECONNECT_GRACE)
+            except asyncio.TimeoutError:
+                raise Exception("No connection to browser extension. Please connect your browser extension first.")
+
+        if self._supports_batch or self._outgoing:
+            future = self.submit(message_type, payload)
+        else:
+            # Nothing to coalesce with: skip the batch writer entirely
+            message, future = self._register(message_type, payload)
+            ws = self._ws
+            if not await self._send_frame(ws, message, [message]):
+                # Never delivered: queue it for the next connection
+                self._enqueue(message)
+                self.clear_ws(ws)
+
         try:
-            # Send message
-            await self.ws.send(json.dumps(message))
-            
             # Wait for response with timeout
             response = await asyncio.wait_for(future, timeout=timeout)
-            
-            if "error" in response:
-                raise Exception(f"Browser extension error: {response['error']}")
-            
-            return response.get("result")
-            
         except asyncio.TimeoutError:
             raise Exception(f"Timeout waiting for response from browser extension")
-        finally:
-            # Clean up pending request
-            self._pending_requests.pop(message_id, None)
+
+        if "error" in response:
+            raise Exception(f"Browser extension error: {response['error']}")
+
+        result = response.get("result")
+        # Raw bytes from a binary frame (see ws_server.parse_binary_frame)
+        if "attachment" in response and isinstance(result, dict):
+            result["attachment"] = response["attachment"]
+        return result
+
+    @staticmethod
+    def tool_call_key(name: str, args: dict) -> int:
+        """Hash a tool call by name and arguments for loop detection."""
+        return hash((name, orjson.dumps(args, option=orjson.OPT_SORT_KEYS, default=str)))
+
+    def repeated_failure(self, key: int) -> Optional[str]:
+        """Return the last error if this call is stuck in a failing retry loop."""
+        cutoff = time.monotonic() - self.LOOP_WINDOW
+        recent = [error for timestamp, call_key, error in self._recent_calls
+                  if call_key == key and timestamp >= cutoff]
+        if len(recent) >= self.LOOP_THRESHOLD and recent[-1] is not None:
+            return recent[-1]
+        return None
+
+    def record_tool_call(self, key: int, error: Optional[str] = None):
+        """Remember a tool call's outcome for loop detection."""
+        self._recent_calls.append((time.monotonic(), key, error))
 
     def handle_response(self, message: dict):
-        """Handle incoming response from browser extension."""
-        message_id = message.get("id")
-        if message_id in self._pending_requests:
-            future = self._pending_requests[message_id]
-            if not future.done():
-                future.set_result(message)
+        """Handle incoming response (or batch of responses) from browser extension."""
+        for response in message.get("batch", [message]):
+            future = self._pending_requests.get(response.get("id"))
+            if future and not future.done():
+                future.set_result(response)
 
     async def close(self):
         """Close the WebSocket connection."""
+        if self._writer_task:
+            self._writer_task.cancel()
+            self._writer_task = None
         if self._ws:
             await self._ws.close()
-            self._ws = None 
\ No newline at end of file
+            self._ws = None
+            self._connected.clear() 
\ No newline at end of file
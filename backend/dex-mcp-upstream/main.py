@@ -8,12 +8,18 @@ and navigating to URLs.
 """
 
 import asyncio
+import atexit
+import functools
+import inspect
 import logging
+import queue
 import signal
-import sys
-from typing import Any, Dict
-import json
+from typing import Any, Dict, Optional
+from logging.handlers import QueueHandler, QueueListener
 
+import orjson
+import uvicorn
+import uvloop
 from mcp.server.fastmcp import FastMCP
 
 from context import Context
@@ -36,11 +42,20 @@ from tools.browser import (
     generate_browsing_analytics_tool
 )
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Configure logging. Records go through a queue and are written by a
+# listener thread, so log output never blocks the event loop.
+_log_queue = queue.SimpleQueue()
+_log_handler = logging.StreamHandler()
+_log_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+_log_listener = QueueListener(_log_queue, _log_handler)
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
+# The queue handler only needs the bare message; the listener's handler
+# applies the real format, so records are not formatted twice.
+_queue_handler = QueueHandler(_log_queue)
+_queue_handler.setFormatter(logging.Formatter('%(message)s'))
+logging.basicConfig(level=logging.INFO, handlers=[_queue_handler])
 logger = logging.getLogger(__name__)
 
 # Initialize FastMCP server and context
@@ -49,111 +64,137 @@ context = Context()
 ws_server = None
 
 
-@mcp.tool()
-async def get_tabs() -> str:
-    """Get all open browser tabs."""
-    return await get_tabs_tool(context)
-
-
-@mcp.tool()
-async def screenshot() -> str:
-    """Take a screenshot of the active tab."""
-    return await screenshot_tool(context)
-
-
-@mcp.tool()
-async def navigate(url: str) -> str:
-    """Navigate to a URL in active tab or specified tab."""
-    return await navigate_tool(context, {"url": url})
-
-
-@mcp.tool()
-async def navigate_tab(url: str, tab_id: int) -> str:
-    """Navigate to a URL in a specific tab."""
-    return await navigate_tool(context, {"url": url, "tab_id": tab_id})
-
-
-@mcp.tool()
-async def select_tab(tab_id: int) -> str:
-    """Switch to a specific browser tab by ID."""
-    return await select_tab_tool(context, {"tab_id": tab_id})
-
-
-@mcp.tool()
-async def new_tab(url: str = None) -> str:
-    """Create a new browser tab, optionally with a specific URL."""
-    params = {}
-    if url:
-        params["url"] = url
-    return await new_tab_tool(context, params)
-
-
-@mcp.tool()
-async def close_tab(tab_id: int = None) -> str:
-    """Close a browser tab by ID, or close the active tab if no ID specified."""
-    params = {}
-    if tab_id is not None:
-        params["tab_id"] = tab_id
-    return await close_tab_tool(context, params)
-
-
-@mcp.tool()
-async def search_google(query: str, tab_id: int = None) -> str:
-    """Perform a Google search in active tab or specified tab."""
-    params = {"query": query}
-    if tab_id is not None:
-        params["tab_id"] = tab_id
-    return await search_google_tool(context, params)
-
-
-@mcp.tool()
-async def click_element(element_id: str, tab_id: int = None) -> str:
-    """Click on a DOM element by its ID."""
-    params = {"element_id": element_id}
-    if tab_id is not None:
-        params["tab_id"] = tab_id
-    return await click_element_tool(context, params)
-
-
-@mcp.tool()
-async def input_text(element_id: str, text: str, tab_id: int = None) -> str:
-    """Type text into a DOM element by its ID."""
-    params = {"element_id": element_id, "text": text}
-    if tab_id is not None:
-        params["tab_id"] = tab_id
-    return await input_text_tool(context, params)
-
-
-@mcp.tool()
-async def send_keys(keys: str, tab_id: int = None) -> str:
-    """Send keyboard shortcuts or key combinations to the page."""
-    params = {"keys": keys}
-    if tab_id is not None:
-        params["tab_id"] = tab_id
-    return await send_keys_tool(context, params)
-
-
-@mcp.tool()
-async def grab_dom(tab_id: int = None) -> str:
-    """Get formatted DOM structure with XPath mappings for elements."""
-    params = {}
-    if tab_id is not None:
-        params["tab_id"] = tab_id
-    return await grab_dom_tool(context, params)
+def _failure_message(result: Any) -> Optional[str]:
+    """Return the error text if a tool result reports a failure, else None.
 
+    Text tools report failures with an "Error"/"Failed" prefix; JSON tools
+    (generate_browsing_analytics) return an {"error": ...} object.
+    """
+    if not isinstance(result, str):
+        return None
+    if result.startswith(("Error", "Failed")):
+        return result
+    if result.startswith("{"):
+        try:
+            payload = orjson.loads(result)
+        except orjson.JSONDecodeError:
+            return None
+        if isinstance(payload, dict) and "error" in payload:
+            return result
+    return None
+
+
+def loop_guard(tool):
+    """Stop LLM retry loops on a tool that keeps failing with the same arguments.
+
+    Every real call is recorded on the context; once an identical call has
+    failed repeatedly (see Context.LOOP_THRESHOLD) the last error is returned
+    straight away instead of calling the tool, and hence the extension, again.
+    Short-circuited calls are not recorded, so a real attempt goes through
+    again once the failures age out of Context.LOOP_WINDOW.
+    """
+    name = tool.__name__
+
+    def check(kwargs: dict):
+        key = context.tool_call_key(name, kwargs)
+        error = context.repeated_failure(key)
+        if error is not None:
+            logger.warning("Short-circuiting repeated failing call to %s", name)
+        return key, error
+
+    if inspect.iscoroutinefunction(tool):
+        @functools.wraps(tool)
+        async def guarded(**kwargs):
+            key, error = check(kwargs)
+            if error is not None:
+                return error
+            try:
+                result = await tool(**kwargs)
+            except Exception as e:
+                context.record_tool_call(key, str(e))
+                raise
+            context.record_tool_call(key, _failure_message(result))
+            return result
+    else:
+        @functools.wraps(tool)
+        def guarded(**kwargs):
+            key, error = check(kwargs)
+            if error is not None:
+                return error
+            try:
+                result = tool(**kwargs)
+            except Exception as e:
+                context.record_tool_call(key, str(e))
+                raise
+            context.record_tool_call(key, _failure_message(result))
+            return result
+
+    return guarded
+
+
+# Declarative table of the browser tools that simply forward their arguments
+# to the matching implementation in tools/browser.py:
+# (tool name, implementation, description, [(param, type, default), ...]).
+# A default of ... marks the parameter as required.
+_BROWSER_TOOLS = [
+    ("get_tabs", get_tabs_tool, "Get all open browser tabs.", []),
+    ("screenshot", screenshot_tool, "Take a screenshot of the active tab.", []),
+    ("navigate", navigate_tool, "Navigate to a URL in active tab or specified tab.",
+        [("url", str, ...)]),
+    ("navigate_tab", navigate_tool, "Navigate to a URL in a specific tab.",
+        [("url", str, ...), ("tab_id", int, ...)]),
+    ("select_tab", select_tab_tool, "Switch to a specific browser tab by ID.",
+        [("tab_id", int, ...)]),
+    ("new_tab", new_tab_tool, "Create a new browser tab, optionally with a specific URL.",
+        [("url", str, None)]),
+    ("close_tab", close_tab_tool, "Close a browser tab by ID, or close the active tab if no ID specified.",
+        [("tab_id", int, None)]),
+    ("search_google", search_google_tool, "Perform a Google search in active tab or specified tab.",
+        [("query", str, ...), ("tab_id", int, None)]),
+    ("click_element", click_element_tool, "Click on a DOM element by its ID.",
+        [("element_id", str, ...), ("tab_id", int, None)]),
+    ("input_text", input_text_tool, "Type text into a DOM element by its ID.",
+        [("element_id", str, ...), ("text", str, ...), ("tab_id", int, None)]),
+    ("send_keys", send_keys_tool, "Send keyboard shortcuts or key combinations to the page.",
+        [("keys", str, ...), ("tab_id", int, None)]),
+    ("grab_dom", grab_dom_tool, "Get formatted DOM structure with XPath mappings for elements.",
+        [("tab_id", int, None)]),
+    ("capture_with_highlights", capture_with_highlights_tool,
+        "Take a screenshot with element highlights for better AI understanding.",
+        [("tab_id", int, None)]),
+    ("add_assistant_message", add_assistant_message_tool, "Manually add a message from the assistant to the chat.",
+        [("message", str, ...)]),
+]
+
+
+def _build_tool(name: str, impl, description: str, params: list):
+    """Generate a typed async wrapper that forwards its arguments to impl.
+
+    The wrapper is compiled from source so it has a real signature for FastMCP
+    to introspect and passes its arguments straight through as keywords.
+    Optional parameters are passed through as None, which every implementation
+    already treats as "not given".
+    """
+    signature = ", ".join(
+        f"{param}: {type_.__name__}" if default is ... else f"{param}: {type_.__name__} = {default!r}"
+        for param, type_, default in params
+    )
+    arguments = "".join(f", {param}={param}" for param, _, _ in params)
+    source = (
+        f"async def {name}({signature}) -> str:\n"
+        f"    return await _impl(context{arguments})\n"
+    )
+    namespace = {"_impl": impl, "context": context}
+    exec(source, namespace)
+    tool = namespace[name]
+    tool.__doc__ = description
+    return tool
 
-@mcp.tool()
-async def capture_with_highlights(tab_id: int = None) -> str:
-    """Take a screenshot with element highlights for better AI understanding."""
-    params = {}
-    if tab_id is not None:
-        params["tab_id"] = tab_id
-    return await capture_with_highlights_tool(context, params)
 
-@mcp.tool()
-async def add_assistant_message(message: str) -> str:
-    """Manually add a message from the assistant to the chat."""
-    return await add_assistant_message_tool(context, {"message": message})
+_BROWSER_TOOL_FNS = {
+    name: mcp.tool()(loop_guard(_build_tool(name, impl, description, params)))
+    for name, impl, description, params in _BROWSER_TOOLS
+}
 
 
 @mcp.tool(
@@ -172,6 +213,7 @@ async def add_assistant_message(message: str) -> str:
         "'What did I browse on May 22nd, 2025?'."
     )
 )
+@loop_guard
 async def query_history_by_date(date: str) -> str:
     """
     Retrieve a summary of your browsing history for a specific date.
@@ -190,10 +232,11 @@ async def query_history_by_date(date: str) -> str:
     Returns:
     - A formatted summary listing each URL, the number of visits, and a brief content summary for that date.
     """
-    logging.info(f"query_history_by_date tool called with date={date}")
-    return await query_history_by_date_tool(context, {"date": date})
+    logger.info("query_history_by_date tool called with date=%s", date)
+    return await query_history_by_date_tool(context, date=date)
 
 @mcp.tool()
+@loop_guard
 def generate_browsing_analytics(output_file: str = "../../data/browsing_analytics.json") -> str:
     """
     Analyze what you search for most and your browsing patterns with website frequency data.
@@ -220,6 +263,80 @@ def generate_browsing_analytics(output_file: str = "../../data/browsing_analytic
 
 
 
+# Tools that batch_execute may fan out to, frozen into parallel tuples with a
+# name -> index map so a batch resolves every call with one lookup up front.
+# Calls go through FastMCP's registered Tool objects so their arguments get the
+# same validation and type coercion as a direct MCP call.
+_TOOL_NAMES = (*_BROWSER_TOOL_FNS, "query_history_by_date")
+_TOOLS = tuple(mcp._tool_manager.get_tool(name) for name in _TOOL_NAMES)
+_TOOL_INDEX = {name: index for index, name in enumerate(_TOOL_NAMES)}
+
+
+@mcp.tool()
+@loop_guard
+async def batch_execute(
+    calls: list[dict],
+    max_concurrent: int = 5,
+    stop_on_error: bool = False,
+    timeout_ms: int = 30000,
+) -> str:
+    """
+    Run several independent browser tools in one call.
+
+    Use this instead of calling tools one at a time when the calls do not depend
+    on each other's results (e.g. grabbing the DOM of several tabs).
+
+    Args:
+        calls: List of tool calls, each shaped like {"name": "grab_dom", "args": {"tab_id": 3}}
+        max_concurrent: Maximum number of calls to run at the same time
+        stop_on_error: Skip calls that have not started yet once any call fails
+        timeout_ms: Per-call timeout in milliseconds
+
+    Returns:
+        JSON list with one {"name", "result"} or {"name", "error"} entry per call, in order
+    """
+    semaphore = asyncio.Semaphore(max(1, max_concurrent))
+    timeout = timeout_ms / 1000
+    failed = False
+
+    async def run_call(call: dict, index: int) -> Any:
+        nonlocal failed
+        async with semaphore:
+            if stop_on_error and failed:
+                raise RuntimeError("Skipped after an earlier call failed")
+            if index < 0:
+                failed = True
+                raise ValueError(f"Unknown tool: {call.get('name')}")
+            try:
+                result = await asyncio.wait_for(_TOOLS[index].run(call.get("args", {})), timeout=timeout)
+            except asyncio.TimeoutError:
+                failed = True
+                raise TimeoutError(f"Timed out after {timeout_ms} ms")
+            except Exception:
+                failed = True
+                raise
+            # Browser tools report failures as "Error ..."/"Failed ..." strings
+            error = _failure_message(result)
+            if error is not None:
+                failed = True
+                raise RuntimeError(error)
+            return result
+
+    indices = [_TOOL_INDEX.get(call.get("name"), -1) for call in calls]
+    results = await asyncio.gather(
+        *[run_call(call, index) for call, index in zip(calls, indices)],
+        return_exceptions=True,
+    )
+
+    output = []
+    for call, result in zip(calls, results):
+        if isinstance(result, BaseException):
+            output.append({"name": call.get("name"), "error": str(result)})
+        else:
+            output.append({"name": call.get("name"), "result": result})
+    return orjson.dumps(output, default=str).decode()
+
+
 async def start_background_services():
     """Start background services like WebSocket server."""
     global ws_server
@@ -228,7 +345,7 @@ async def start_background_services():
         ws_server = await start_websocket_server(context)
         logger.info("WebSocket server started successfully")
     except Exception as e:
-        logger.error(f"Failed to start WebSocket server: {e}")
+        logger.error("Failed to start WebSocket server: %s", e)
         raise
 
 
@@ -249,53 +366,44 @@ async def cleanup():
 
 
 # Set up signal handlers for graceful shutdown
-def setup_signal_handlers():
-    def signal_handler(signum, frame):
+def setup_signal_handlers(server: uvicorn.Server):
+    """Stop the MCP server on SIGINT/SIGTERM; main() then runs cleanup()."""
+    loop = asyncio.get_running_loop()
+
+    def signal_handler():
         logger.info("Received shutdown signal")
-        asyncio.create_task(cleanup())
-        sys.exit(0)
-    
-    signal.signal(signal.SIGINT, signal_handler)
-    signal.signal(signal.SIGTERM, signal_handler)
+        server.should_exit = True
 
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, signal_handler)
 
-if __name__ == "__main__":
-    # Set up signal handlers
-    setup_signal_handlers()
-    
-    # Start background services before running MCP server
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    
-    try:
-        # Start WebSocket server on the newly-created loop
-        loop.run_until_complete(start_background_services())
 
-        # ---- Run MCP server in a background thread ----------------------
-        import threading
+async def main():
+    """Run the WebSocket server and the MCP SSE app on a single event loop."""
+    config = uvicorn.Config(
+        mcp.sse_app(),
+        host=mcp.settings.host,
+        port=mcp.settings.port,
+        log_level=mcp.settings.log_level.lower(),
+        log_config=None,  # propagate uvicorn logs to the queued root handler
+        loop="uvloop",
+    )
+    server = uvicorn.Server(config)
+    setup_signal_handlers(server)
 
-        def run_mcp():
-            try:
-                logger.info("Starting MCP server with SSE transport…")
-                mcp.run(transport="sse")
-            except Exception as e:
-                logger.error(f"MCP server stopped: {e}")
+    try:
+        logger.info("Starting MCP server with SSE transport…")
+        await asyncio.gather(start_background_services(), server.serve())
+    finally:
+        await cleanup()
 
-        mcp_thread = threading.Thread(target=run_mcp, daemon=True)
-        mcp_thread.start()
 
-        # ---- Keep the asyncio loop alive for the WebSocket server ------
-        loop.run_forever()
+if __name__ == "__main__":
+    uvloop.install()
 
+    try:
+        asyncio.run(main())
     except KeyboardInterrupt:
         logger.info("Interrupted by user")
     except Exception as e:
-        logger.error(f"Fatal error: {e}")
-    finally:
-        # Clean up
-        try:
-            loop.run_until_complete(cleanup())
-        except Exception:
-            pass
-        loop.stop()
-        loop.close()
+        logger.error("Fatal error: %s", e)
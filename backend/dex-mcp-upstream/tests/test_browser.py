@@ -0,0 +1,93 @@
+import asyncio
+import base64
+from datetime import date
+from io import BytesIO
+
+import orjson
+import pytest
+from PIL import Image
+
+from tools.browser import (
+    _compact_screenshot,
+    _load_history,
+    _parse_query_date,
+    capture_with_highlights_tool,
+    query_history_by_date_tool,
+)
+
+
+def _png(width: int, height: int) -> bytes:
+    buffer = BytesIO()
+    Image.new("RGB", (width, height), "red").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _decode(data_url: str) -> Image.Image:
+    return Image.open(BytesIO(base64.b64decode(data_url.split(",", 1)[1])))
+
+
+def test_load_history_tolerates_rows_without_timestamp(tmp_path):
+    data_file = tmp_path / "contents.json"
+    data_file.write_bytes(orjson.dumps([
+        {"url": "https://example.com/a", "timestamp": "2025-05-24T11:29:22Z", "no_of_visits": 1},
+        {"url": "https://example.com/b", "no_of_visits": 2},
+        {"url": "https://example.com/c", "timestamp": None, "no_of_visits": 3},
+    ]))
+
+    rows, rows_by_date = _load_history(str(data_file))
+
+    assert len(rows) == 3
+    assert [row["url"] for row in rows_by_date["2025-05-24"]] == ["https://example.com/a"]
+    assert type(rows_by_date) is dict
+
+    # A cached load returns the same index
+    assert _load_history(str(data_file)) == (rows, rows_by_date)
+
+
+def test_compact_screenshot_downscales_to_webp():
+    png = _png(2048, 1536)
+    data_url = "data:image/png;base64," + base64.b64encode(png).decode()
+
+    for image in (png, data_url):
+        compacted = _compact_screenshot(image)
+        assert compacted.startswith("data:image/webp;base64,")
+        decoded = _decode(compacted)
+        assert decoded.format == "WEBP"
+        assert decoded.size == (1024, 768)
+
+
+def test_compact_screenshot_returns_undecodable_images_unchanged():
+    assert _compact_screenshot("not a data url") == "not a data url"
+    assert _compact_screenshot("data:image/png;base64,!!!") == "data:image/png;base64,!!!"
+    assert _compact_screenshot(b"not an image") == "data:image/png;base64," + base64.b64encode(b"not an image").decode()
+
+
+def test_capture_with_highlights_keeps_result_when_compaction_fails():
+    class FakeContext:
+        async def send_socket_message(self, message_type, payload=None):
+            return {"success": True, "data": {"dataUrl": "not a data url", "highlightCount": 2}}
+
+    result = asyncio.run(capture_with_highlights_tool(FakeContext()))
+
+    assert result == {"success": True, "data": {"dataUrl": "not a data url", "highlightCount": 2}}
+
+
+@pytest.mark.parametrize("date_str, expected", [
+    ("2025-05-24", date(2025, 5, 24)),
+    ("May 24th, 2025", date(2025, 5, 24)),
+    ("may 22nd 2025", date(2025, 5, 22)),
+])
+def test_parse_query_date(date_str, expected):
+    assert _parse_query_date(date_str) == expected
+
+
+def test_parse_query_date_rejects_invalid_dates():
+    with pytest.raises(ValueError, match="unrecognized date"):
+        _parse_query_date("yesterday-ish")
+
+
+def test_query_history_by_date_reports_invalid_dates():
+    result = asyncio.run(query_history_by_date_tool(None, date="yesterday-ish"))
+
+    assert result.startswith("Error: Invalid date format.")
+    assert "unrecognized date 'yesterday-ish'" in result
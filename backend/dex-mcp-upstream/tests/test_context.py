@@ -0,0 +1,156 @@
+import asyncio
+
+import orjson
+import pytest
+import websockets
+
+from context import Context
+
+
+class FakeWebSocket:
+    """Stands in for the extension: records frames and answers every request."""
+
+    def __init__(self, context: Context, respond: bool = True, closed: bool = False):
+        self.context = context
+        self.respond = respond
+        self.closed = closed
+        self.frames = []
+
+    async def send(self, data: str):
+        if self.closed:
+            raise websockets.exceptions.ConnectionClosed(None, None)
+        frame = orjson.loads(data)
+        self.frames.append(frame)
+        if self.respond:
+            responses = [{"id": message["id"], "result": message["type"]}
+                         for message in frame.get("batch", [frame])]
+            asyncio.get_running_loop().call_soon(self.context.handle_response, {"batch": responses})
+
+    async def close(self):
+        self.closed = True
+
+
+def test_batches_concurrent_requests_when_extension_supports_it():
+    async def run():
+        context = Context()
+        ws = FakeWebSocket(context)
+        context.set_ws(ws)
+        context.set_capabilities(["batch"])
+
+        results = await asyncio.gather(*[context.send_socket_message(f"t{i}") for i in range(20)])
+
+        assert results == [f"t{i}" for i in range(20)]
+        # MAX_BATCH messages in the first frame, the remainder in a second
+        assert [len(frame["batch"]) for frame in ws.frames] == [Context.MAX_BATCH, 20 - Context.MAX_BATCH]
+        await context.close()
+
+    asyncio.run(run())
+
+
+def test_sends_one_frame_per_message_without_batch_capability():
+    async def run():
+        context = Context()
+        ws = FakeWebSocket(context)
+        context.set_ws(ws)
+
+        results = await asyncio.gather(*[context.send_socket_message(f"t{i}") for i in range(5)])
+
+        assert results == [f"t{i}" for i in range(5)]
+        assert [frame["type"] for frame in ws.frames] == [f"t{i}" for i in range(5)]
+        assert not any("batch" in frame for frame in ws.frames)
+        # Unbatched requests are written directly, without the batch writer
+        assert context._writer_task is None
+        await context.close()
+
+    asyncio.run(run())
+
+
+def test_requeues_requests_after_connection_closed():
+    async def run():
+        context = Context()
+        dead = FakeWebSocket(context, closed=True)
+        context.set_ws(dead)
+
+        request = asyncio.create_task(context.send_socket_message("get_tabs"))
+        await asyncio.sleep(0.05)
+        # The send failed, so the writer forgot the dead socket and kept the request
+        assert not request.done()
+        assert not context.has_ws()
+
+        alive = FakeWebSocket(context)
+        context.set_ws(alive)
+
+        assert await request == "get_tabs"
+        assert [frame["type"] for frame in alive.frames] == ["get_tabs"]
+        await context.close()
+
+    asyncio.run(run())
+
+
+def test_clear_ws_fails_requests_already_sent():
+    async def run():
+        context = Context()
+        ws = FakeWebSocket(context, respond=False)
+        context.set_ws(ws)
+
+        request = asyncio.create_task(context.send_socket_message("grab_dom"))
+        await asyncio.sleep(0.05)
+        assert len(ws.frames) == 1
+
+        context.clear_ws(ws)
+
+        with pytest.raises(Exception, match="Connection to browser extension lost"):
+            await request
+        assert context._pending_requests == {}
+
+    asyncio.run(run())
+
+
+def test_clear_ws_fails_requests_sent_on_replaced_connection():
+    async def run():
+        context = Context()
+        old_ws = FakeWebSocket(context, respond=False)
+        context.set_ws(old_ws)
+
+        request = asyncio.create_task(context.send_socket_message("grab_dom"))
+        await asyncio.sleep(0.05)
+        assert len(old_ws.frames) == 1
+
+        # The extension reconnects before the old connection's handler exits
+        new_ws = FakeWebSocket(context)
+        context.set_ws(new_ws)
+        context.clear_ws(old_ws)
+
+        with pytest.raises(Exception, match="Connection to browser extension lost"):
+            await request
+        assert context.has_ws()
+        assert await context.send_socket_message("get_tabs") == "get_tabs"
+        await context.close()
+
+    asyncio.run(run())
+
+
+def test_waits_for_reconnect_within_grace_period():
+    async def run():
+        context = Context()
+        request = asyncio.create_task(context.send_socket_message("get_tabs"))
+        await asyncio.sleep(0.05)
+        assert not request.done()
+
+        context.set_ws(FakeWebSocket(context))
+
+        assert await request == "get_tabs"
+        await context.close()
+
+    asyncio.run(run())
+
+
+def test_fails_when_no_extension_connects_within_grace_period():
+    async def run():
+        context = Context()
+        context.RECONNECT_GRACE = 0.05
+
+        with pytest.raises(Exception, match="No connection to browser extension"):
+            await context.send_socket_message("get_tabs")
+
+    asyncio.run(run())
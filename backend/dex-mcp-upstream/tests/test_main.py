@@ -0,0 +1,92 @@
+import asyncio
+import types
+
+import orjson
+
+import context as context_module
+import main
+from context import Context
+
+
+def test_loop_guard_retries_after_window(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(context_module, "time", types.SimpleNamespace(monotonic=lambda: now[0]))
+    monkeypatch.setattr(main, "context", Context())
+
+    calls = []
+
+    async def navigate(url: str) -> str:
+        calls.append(url)
+        return f"Error navigating to {url}: boom"
+
+    guarded = main.loop_guard(navigate)
+
+    # Three real failures trip the guard...
+    for _ in range(3):
+        asyncio.run(guarded(url="x"))
+        now[0] += 1
+    assert len(calls) == 3
+
+    # ...so further identical retries are short-circuited
+    for _ in range(3):
+        assert asyncio.run(guarded(url="x")) == "Error navigating to x: boom"
+        now[0] += 1
+    assert len(calls) == 3
+
+    # Once the real failures age out of the window the tool is called again,
+    # however many short-circuited retries happened in between
+    now[0] = 1002 + Context.LOOP_WINDOW + 0.1
+    asyncio.run(guarded(url="x"))
+    assert len(calls) == 4
+
+
+def test_batch_execute_treats_failure_strings_as_errors(monkeypatch):
+    # No extension is connected, so the first navigate fails with an error string
+    monkeypatch.setattr(main.context, "RECONNECT_GRACE", 0.01)
+    monkeypatch.setattr(main.context, "_recent_calls", main.context._recent_calls.copy())
+
+    calls = [
+        {"name": "navigate", "args": {"url": "https://example.com"}},
+        {"name": "get_tabs"},
+        {"name": "grab_dom"},
+    ]
+    output = orjson.loads(asyncio.run(main.batch_execute(calls=calls, max_concurrent=1, stop_on_error=True)))
+
+    assert [sorted(entry) for entry in output] == [["error", "name"]] * 3
+    assert output[0]["error"].startswith("Error navigating to https://example.com")
+    assert output[1]["error"] == output[2]["error"] == "Skipped after an earlier call failed"
+
+
+def test_batch_execute_validates_and_coerces_arguments(monkeypatch):
+    monkeypatch.setattr(main.context, "_recent_calls", main.context._recent_calls.copy())
+    sent = []
+
+    async def send_socket_message(message_type, payload=None, timeout=30.0):
+        sent.append((message_type, payload))
+        return {"success": True}
+
+    monkeypatch.setattr(main.context, "send_socket_message", send_socket_message)
+
+    calls = [
+        {"name": "close_tab", "args": {"tab_id": "3"}},
+        {"name": "navigate", "args": {}},
+    ]
+    output = orjson.loads(asyncio.run(main.batch_execute(calls=calls)))
+
+    # The string tab_id is coerced to an int, as on the normal MCP path
+    assert sent == [("close_tab", {"tab_id": 3})]
+    assert output[0]["result"].startswith("Successfully closed tab 3")
+    # Missing arguments are reported as a validation error
+    assert "url" in output[1]["error"] and "Field required" in output[1]["error"]
+
+
+def test_failure_message_recognises_tool_failures():
+    assert main._failure_message("Failed to fetch tabs.") == "Failed to fetch tabs."
+    assert main._failure_message("Error: Browsing history data file not found.") is not None
+    error_json = orjson.dumps({"error": "Error generating browsing analytics: boom"}, option=orjson.OPT_INDENT_2).decode()
+    assert main._failure_message(error_json) == error_json
+
+    assert main._failure_message("No open tabs found.") is None
+    assert main._failure_message(orjson.dumps({"total_entries": 0}).decode()) is None
+    assert main._failure_message("{not json") is None
+    assert main._failure_message({"error": "not a tool result"}) is None
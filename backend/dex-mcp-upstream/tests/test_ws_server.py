@@ -0,0 +1,29 @@
+import orjson
+import pytest
+
+from ws_server import parse_binary_frame
+
+
+def _frame(header, attachment: bytes = b"") -> bytes:
+    encoded = orjson.dumps(header)
+    return len(encoded).to_bytes(4, "big") + encoded + attachment
+
+
+def test_parse_binary_frame_splits_header_and_attachment():
+    data = parse_binary_frame(_frame({"id": "abc", "result": {"success": True}}, b"\x89PNG\x00\xff"))
+
+    assert data == {"id": "abc", "result": {"success": True}, "attachment": b"\x89PNG\x00\xff"}
+
+
+def test_parse_binary_frame_rejects_truncated_frames():
+    frame = _frame({"id": "abc"}, b"png")
+
+    with pytest.raises(ValueError, match="too short"):
+        parse_binary_frame(frame[:3])
+    with pytest.raises(ValueError, match="truncated"):
+        parse_binary_frame(frame[:8])
+
+
+def test_parse_binary_frame_rejects_non_object_header():
+    with pytest.raises(ValueError, match="JSON object"):
+        parse_binary_frame(_frame(["abc"], b"png"))
@@ -1,16 +1,108 @@
 """Browser tools for interacting with the browser extension."""
 
-from typing import Any, Dict
+import asyncio
 from context import Context
-import json
-from datetime import datetime
+import orjson
+import pybase64
+from PIL import Image
+from datetime import date as _date, datetime
+from functools import lru_cache
+from io import BytesIO
+import heapq
+import logging
 import os
 from urllib.parse import urlparse
 from collections import defaultdict, Counter
 import re
 
+logger = logging.getLogger(__name__)
 
-async def get_tabs_tool(context: Context, params: Dict[str, Any] = None) -> str:
+
+# Screenshots are downscaled to fit this box and re-encoded as lossy WebP;
+# models view images at roughly this size anyway.
+SCREENSHOT_MAX_SIZE = (1024, 1024)
+SCREENSHOT_WEBP_QUALITY = 75
+
+# Fast path for the YYYY-MM-DD dates LLM tool calls almost always send
+_ISO_DATE_RE = re.compile(r"^(\d{4})-(\d{2})-(\d{2})$")
+# Ordinal suffixes in natural-language dates, e.g. the "th" in "May 24th, 2025"
+_ORDINAL_RE = re.compile(r"(?<=\d)(st|nd|rd|th)\b")
+_NATURAL_DATE_FORMATS = ("%Y-%m-%d", "%B %d, %Y", "%b %d, %Y", "%B %d %Y", "%b %d %Y")
+
+
+@lru_cache(maxsize=512)
+def _parse_query_date(date_str: str) -> _date:
+    """Parse a YYYY-MM-DD or natural-language date (e.g. "May 24th, 2025").
+
+    Raises ValueError if the date cannot be parsed.
+    """
+    date_str = date_str.strip()
+    match = _ISO_DATE_RE.match(date_str)
+    if match:
+        return _date(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+
+    cleaned = _ORDINAL_RE.sub("", date_str)
+    for fmt in _NATURAL_DATE_FORMATS:
+        try:
+            return datetime.strptime(cleaned, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"unrecognized date '{date_str}'")
+
+
+# Parsed contents.json per path: (mtime, rows, rows grouped by YYYY-MM-DD date)
+_history_cache: dict = {}
+
+
+def _load_history(data_file: str) -> tuple:
+    """Load browsing history rows and their per-date index.
+
+    The file is parsed and indexed once and reused until its mtime changes, so
+    a date query only touches that day's rows. Returns (rows, rows_by_date).
+    """
+    mtime = os.path.getmtime(data_file)
+    cached = _history_cache.get(data_file)
+    if cached and cached[0] == mtime:
+        return cached[1], cached[2]
+
+    with open(data_file, 'rb') as f:
+        rows = orjson.loads(f.read())
+
+    grouped = defaultdict(list)
+    for row in rows:
+        grouped[(row.get('timestamp') or '').split('T')[0]].append(row)
+    rows_by_date = dict(grouped)
+
+    _history_cache[data_file] = (mtime, rows, rows_by_date)
+    return rows, rows_by_date
+
+
+def _to_data_url(data: bytes, mime: str = "image/png") -> str:
+    """Encode raw image bytes as a base64 data URL."""
+    return f"data:{mime};base64,{pybase64.b64encode_as_string(data)}"
+
+
+def _compact_screenshot(image) -> str:
+    """Downscale a screenshot and return it as a WebP data URL.
+
+    Accepts raw image bytes (from a binary frame) or a base64 data URL.
+    Decoding and re-encoding is CPU-bound, so callers run this in a worker
+    thread to keep the shared event loop responsive. Compaction is only an
+    optimisation: if the image cannot be decoded it is returned unchanged.
+    """
+    try:
+        raw = pybase64.b64decode(image.split(",", 1)[1]) if isinstance(image, str) else image
+        img = Image.open(BytesIO(raw))
+        img.thumbnail(SCREENSHOT_MAX_SIZE, Image.Resampling.LANCZOS)
+        buffer = BytesIO()
+        img.save(buffer, format="WEBP", quality=SCREENSHOT_WEBP_QUALITY)
+    except (ValueError, IndexError, OSError) as e:
+        logger.warning("Could not compact screenshot, returning it unchanged: %s", e)
+        return image if isinstance(image, str) else _to_data_url(image)
+    return _to_data_url(buffer.getvalue(), "image/webp")
+
+
+async def get_tabs_tool(context: Context) -> str:
     """Get all open browser tabs.
     
     Params: None
@@ -19,7 +111,7 @@ async def get_tabs_tool(context: Context, params: Dict[str, Any] = None) -> str:
         result = await context.send_socket_message("get_tabs", {})
         
         if not result or "tabs" not in result:
-            return "No tabs found or unable to fetch tabs."
+            return "Failed to fetch tabs."
         
         tabs = result["tabs"]
         if not tabs:
@@ -39,7 +131,7 @@ async def get_tabs_tool(context: Context, params: Dict[str, Any] = None) -> str:
         return f"Error getting tabs: {str(e)}"
 
 
-async def screenshot_tool(context: Context, params: Dict[str, Any] = None) -> str:
+async def screenshot_tool(context: Context) -> str:
     """Take a screenshot of the active tab.
     
     Params: None
@@ -51,6 +143,11 @@ async def screenshot_tool(context: Context, params: Dict[str, Any] = None) -> st
             return "Failed to take screenshot."
         
         if result.get("success"):
+            # Screenshots sent as binary frames arrive as raw bytes
+            if "attachment" in result:
+                result["data"] = await asyncio.to_thread(_compact_screenshot, result.pop("attachment"))
+            elif isinstance(result.get("data"), str):
+                result["data"] = await asyncio.to_thread(_compact_screenshot, result["data"])
             return result
         else:
             return f"Failed to take screenshot: {result.get('error', 'Unknown error')}"
@@ -59,19 +156,13 @@ async def screenshot_tool(context: Context, params: Dict[str, Any] = None) -> st
         return f"Error taking screenshot: {str(e)}"
 
 
-async def navigate_tool(context: Context, params: Dict[str, Any] = None) -> str:
+async def navigate_tool(context: Context, *, url: str, tab_id: int = None) -> str:
     """Navigate to a URL in active tab or specified tab.
     
     Params:
         url (str): Required - URL to navigate to
         tab_id (int): Optional - Specific tab ID, defaults to active tab
     """
-    if not params or "url" not in params:
-        return "Error: URL parameter is required"
-    
-    url = params["url"]
-    tab_id = params.get("tab_id")
-    
     payload = {"url": url}
     if tab_id is not None:
         payload["tab_id"] = tab_id
@@ -93,17 +184,12 @@ async def navigate_tool(context: Context, params: Dict[str, Any] = None) -> str:
         return f"Error navigating to {url}: {str(e)}"
 
 
-async def select_tab_tool(context: Context, params: Dict[str, Any] = None) -> str:
+async def select_tab_tool(context: Context, *, tab_id: int) -> str:
     """Switch to a specific browser tab by ID.
     
     Params:
         tab_id (int): Required - Tab ID to switch to
     """
-    if not params or "tab_id" not in params:
-        return "Error: tab_id parameter is required"
-    
-    tab_id = params["tab_id"]
-    
     try:
         result = await context.send_socket_message("select_tab", {"tab_id": tab_id})
         
@@ -121,14 +207,12 @@ async def select_tab_tool(context: Context, params: Dict[str, Any] = None) -> st
         return f"Error selecting tab {tab_id}: {str(e)}"
 
 
-async def new_tab_tool(context: Context, params: Dict[str, Any] = None) -> str:
+async def new_tab_tool(context: Context, *, url: str = None) -> str:
     """Create a new browser tab, optionally with a specific URL.
     
     Params:
         url (str): Optional - URL to open in new tab, defaults to blank tab
     """
-    url = params.get("url") if params else None
-    
     payload = {}
     if url:
         payload["url"] = url
@@ -155,14 +239,12 @@ async def new_tab_tool(context: Context, params: Dict[str, Any] = None) -> str:
         return f"Error creating new tab: {str(e)}"
 
 
-async def close_tab_tool(context: Context, params: Dict[str, Any] = None) -> str:
+async def close_tab_tool(context: Context, *, tab_id: int = None) -> str:
     """Close a browser tab by ID, or close the active tab if no ID specified.
     
     Params:
         tab_id (int): Optional - Tab ID to close, defaults to active tab
     """
-    tab_id = params.get("tab_id") if params else None
-    
     payload = {}
     if tab_id is not None:
         payload["tab_id"] = tab_id
@@ -184,19 +266,13 @@ async def close_tab_tool(context: Context, params: Dict[str, Any] = None) -> str
         return f"Error closing tab: {str(e)}"
 
 
-async def search_google_tool(context: Context, params: Dict[str, Any] = None) -> str:
+async def search_google_tool(context: Context, *, query: str, tab_id: int = None) -> str:
     """Perform a Google search in active tab or specified tab.
     
     Params:
         query (str): Required - Search query text
         tab_id (int): Optional - Specific tab ID, defaults to active tab
     """
-    if not params or "query" not in params:
-        return "Error: query parameter is required"
-    
-    query = params["query"]
-    tab_id = params.get("tab_id")
-    
     payload = {"query": query}
     if tab_id is not None:
         payload["tab_id"] = tab_id
@@ -218,19 +294,13 @@ async def search_google_tool(context: Context, params: Dict[str, Any] = None) ->
         return f"Error searching Google for '{query}': {str(e)}"
 
 
-async def click_element_tool(context: Context, params: Dict[str, Any] = None) -> str:
+async def click_element_tool(context: Context, *, element_id: str, tab_id: int = None) -> str:
     """Click on a DOM element by its ID.
     
     Params:
         element_id (str): Required - Element ID to click
         tab_id (int): Optional - Specific tab ID, defaults to active tab
     """
-    if not params or "element_id" not in params:
-        return "Error: element_id parameter is required"
-    
-    element_id = params["element_id"]
-    tab_id = params.get("tab_id")
-    
     payload = {"element_id": element_id}
     if tab_id is not None:
         payload["tab_id"] = tab_id
@@ -252,7 +322,7 @@ async def click_element_tool(context: Context, params: Dict[str, Any] = None) ->
         return f"Error clicking element '{element_id}': {str(e)}"
 
 
-async def input_text_tool(context: Context, params: Dict[str, Any] = None) -> str:
+async def input_text_tool(context: Context, *, element_id: str, text: str, tab_id: int = None) -> str:
     """Type text into a DOM element by its ID.
     
     Params:
@@ -260,13 +330,6 @@ async def input_text_tool(context: Context, params: Dict[str, Any] = None) -> st
         text (str): Required - Text to input
         tab_id (int): Optional - Specific tab ID, defaults to active tab
     """
-    if not params or "element_id" not in params or "text" not in params:
-        return "Error: element_id and text parameters are required"
-    
-    element_id = params["element_id"]
-    text = params["text"]
-    tab_id = params.get("tab_id")
-    
     payload = {"element_id": element_id, "text": text}
     if tab_id is not None:
         payload["tab_id"] = tab_id
@@ -288,19 +351,13 @@ async def input_text_tool(context: Context, params: Dict[str, Any] = None) -> st
         return f"Error inputting text into element '{element_id}': {str(e)}"
 
 
-async def send_keys_tool(context: Context, params: Dict[str, Any] = None) -> str:
+async def send_keys_tool(context: Context, *, keys: str, tab_id: int = None) -> str:
     """Send keyboard shortcuts or key combinations to the page.
     
     Params:
         keys (str): Required - Key combination (e.g. 'Ctrl+C', 'Enter', 'Tab')
         tab_id (int): Optional - Specific tab ID, defaults to active tab
     """
-    if not params or "keys" not in params:
-        return "Error: keys parameter is required"
-    
-    keys = params["keys"]
-    tab_id = params.get("tab_id")
-    
     payload = {"keys": keys}
     if tab_id is not None:
         payload["tab_id"] = tab_id
@@ -322,14 +379,12 @@ async def send_keys_tool(context: Context, params: Dict[str, Any] = None) -> str
         return f"Error sending keys '{keys}': {str(e)}"
 
 
-async def grab_dom_tool(context: Context, params: Dict[str, Any] = None) -> str:
+async def grab_dom_tool(context: Context, *, tab_id: int = None) -> str:
     """Get formatted DOM structure with XPath mappings for elements.
     
     Params:
         tab_id (int): Optional - Specific tab ID, defaults to active tab
     """
-    tab_id = params.get("tab_id") if params else None
-    
     payload = {}
     if tab_id is not None:
         payload["tab_id"] = tab_id
@@ -349,14 +404,12 @@ async def grab_dom_tool(context: Context, params: Dict[str, Any] = None) -> str:
         return f"Error grabbing DOM: {str(e)}"
 
 
-async def capture_with_highlights_tool(context: Context, params: Dict[str, Any] = None) -> str:
+async def capture_with_highlights_tool(context: Context, *, tab_id: int = None) -> str:
     """Take a screenshot with element highlights for better AI understanding.
     
     Params:
         tab_id (int): Optional - Specific tab ID, defaults to active tab
     """
-    tab_id = params.get("tab_id") if params else None
-    
     payload = {}
     if tab_id is not None:
         payload["tab_id"] = tab_id
@@ -368,6 +421,11 @@ async def capture_with_highlights_tool(context: Context, params: Dict[str, Any]
             return "Failed to capture screenshot with highlights"
         
         if result.get("success"):
+            # Screenshots sent as binary frames arrive as raw bytes
+            if "attachment" in result:
+                result.setdefault("data", {})["dataUrl"] = await asyncio.to_thread(_compact_screenshot, result.pop("attachment"))
+            elif isinstance(result.get("data"), dict) and result["data"].get("dataUrl"):
+                result["data"]["dataUrl"] = await asyncio.to_thread(_compact_screenshot, result["data"]["dataUrl"])
             return result
         else:
             return f"Failed to capture screenshot with highlights: {result.get('error', 'Unknown error')}"
@@ -376,17 +434,12 @@ async def capture_with_highlights_tool(context: Context, params: Dict[str, Any]
         return f"Error capturing screenshot with highlights: {str(e)}"
 
 
-async def add_assistant_message_tool(context: Context, params: Dict[str, Any] = None) -> str:
+async def add_assistant_message_tool(context: Context, *, message: str) -> str:
     """Add an assistant message to the chat.
     
     Params:
         message (str): Required - Message to add to the chat
     """
-    if not params or "message" not in params:
-        return "Error: message parameter is required"
-    
-    message = params["message"]
-    
     try:
         result = await context.send_socket_message("add_assistant_message", {"message": message})
         
@@ -402,34 +455,56 @@ async def add_assistant_message_tool(context: Context, params: Dict[str, Any] =
         return f"Error adding assistant message: {str(e)}"
 
 
-async def query_history_by_date_tool(context: Context, params: Dict[str, Any] = None) -> str:
+def _iter_history_summary(date_str: str, items: list):
+    """Yield the lines of the browsing summary for one day's history items."""
+    search_queries = []
+    for item in items:
+        # Extract search queries from Google searches
+        content = item.get('content', '')
+        if 'Google search:' in content:
+            query = content.replace('Google search:', '').strip()
+            if query:
+                search_queries.append(query)
+    
+    yield f"Browsing Activity for {date_str}:\n"
+    yield f"Total pages visited: {len(items)}\n\n"
+    
+    if search_queries:
+        yield f"Google Searches ({len(search_queries)} total):\n"
+        for i, query in enumerate(search_queries, 1):
+            yield f"{i}. {query}\n"
+        yield "\n"
+    
+    # Show most visited domains
+    domains = Counter()
+    for item in items:
+        try:
+            domain = urlparse(item['url']).netloc.lower()
+            if domain.startswith('www.'):
+                domain = domain[4:]
+            domains[domain] += item.get('no_of_visits', 1)
+        except:
+            continue
+    
+    if domains:
+        yield "Most Visited Sites:\n"
+        # most_common(n) does a heap-based top-k instead of sorting every domain
+        for domain, visits in domains.most_common(10):
+            yield f"- {domain}: {visits} visits\n"
+
+
+async def query_history_by_date_tool(context: Context, *, date: str) -> str:
     """Query browsing history for a specific date and return matching items with summaries.
     
     Params:
         date (str): Required - Date in YYYY-MM-DD format or natural language (e.g., "May 24th, 2025")
     """
-    if not params or "date" not in params:
-        return "Error: date parameter is required (format: YYYY-MM-DD or natural language like 'May 24th, 2025')"
-    
-    date_str = params["date"]
+    date_str = date
     
     try:
-        # Try to convert natural language dates to YYYY-MM-DD format
-        date_conversions = {
-            "may 22nd, 2025": "2025-05-22",
-            "may 23rd, 2025": "2025-05-23", 
-            "may 24th, 2025": "2025-05-24",
-            "may 21st, 2025": "2025-05-21",
-            "may 20th, 2025": "2025-05-20"
-        }
-        
-        # Check if it's a natural language date
-        normalized_date = date_str.lower().strip()
-        if normalized_date in date_conversions:
-            date_str = date_conversions[normalized_date]
-        
-        # Validate date format
-        query_date = datetime.strptime(date_str, '%Y-%m-%d')
+        # Normalize the date to YYYY-MM-DD format
+        query_date = _parse_query_date(date_str)
+        date_str = query_date.isoformat()
         
         # Load history data from contents.json
         data_file = "../../data/contents.json"
@@ -437,59 +512,17 @@ async def query_history_by_date_tool(context: Context, params: Dict[str, Any] =
             # Try alternative path
             data_file = "../data/contents.json"
             if not os.path.exists(data_file):
-                return f"Browsing history data file not found. Checked paths: ../../data/contents.json and ../data/contents.json"
-        
-        with open(data_file, 'r', encoding='utf-8') as f:
-            history_data = json.load(f)
-        
-        # Filter items for the specified date
-        matching_items = []
-        search_queries = []
-        
-        for item in history_data:
-            item_date = datetime.strptime(item['timestamp'].split('T')[0], '%Y-%m-%d')
-            if item_date.date() == query_date.date():
-                matching_items.append(item)
-                
-                # Extract search queries from Google searches
-                content = item.get('content', '')
-                if 'Google search:' in content:
-                    query = content.replace('Google search:', '').strip()
-                    if query:
-                        search_queries.append(query)
+                return f"Error: Browsing history data file not found. Checked paths: ../../data/contents.json and ../data/contents.json"
+        
+        _, history_by_date = _load_history(data_file)
         
+        # Look up items for the specified date
+        matching_items = history_by_date.get(date_str, [])
         if not matching_items:
             return f"No browsing history found for {date_str}"
         
-        # Generate summary
-        summary = f"Browsing Activity for {date_str}:\n"
-        summary += f"Total pages visited: {len(matching_items)}\n\n"
-        
-        if search_queries:
-            summary += f"Google Searches ({len(search_queries)} total):\n"
-            for i, query in enumerate(search_queries, 1):
-                summary += f"{i}. {query}\n"
-            summary += "\n"
-        
-        # Show most visited domains
-        domains = {}
-        for item in matching_items:
-            try:
-                from urllib.parse import urlparse
-                domain = urlparse(item['url']).netloc.lower()
-                if domain.startswith('www.'):
-                    domain = domain[4:]
-                domains[domain] = domains.get(domain, 0) + item.get('no_of_visits', 1)
-            except:
-                continue
-        
-        if domains:
-            summary += "Most Visited Sites:\n"
-            sorted_domains = sorted(domains.items(), key=lambda x: x[1], reverse=True)[:10]
-            for domain, visits in sorted_domains:
-                summary += f"- {domain}: {visits} visits\n"
-        
-        return summary
+        # Build the summary line by line and join once at the end
+        return "".join(_iter_history_summary(date_str, matching_items))
             
     except ValueError as e:
         return f"Error: Invalid date format. Please use YYYY-MM-DD format or natural language like 'May 24th, 2025'. Error: {str(e)}"
@@ -520,10 +553,9 @@ def generate_browsing_analytics_tool(output_file: str = "../../data/browsing_ana
             # Try alternative path
             data_file = "../data/contents.json"
             if not os.path.exists(data_file):
-                return json.dumps({"error": f"Browsing history data file not found. Checked paths: ../../data/contents.json and ../data/contents.json"}, indent=2)
+                return orjson.dumps({"error": f"Browsing history data file not found. Checked paths: ../../data/contents.json and ../data/contents.json"}, option=orjson.OPT_INDENT_2).decode()
         
-        with open(data_file, 'r', encoding='utf-8') as f:
-            browsing_data = json.load(f)
+        browsing_data, _ = _load_history(data_file)
         
         # Initialize analytics structures
         domain_stats = defaultdict(lambda: {
@@ -605,8 +637,9 @@ def generate_browsing_analytics_tool(output_file: str = "../../data/browsing_ana
                 'top_urls': top_urls
             })
         
-        # Sort domains by total visits
-        domain_list.sort(key=lambda x: x['total_visits'], reverse=True)
+        # Only the top 15 domains are reported, so select them with a heap
+        # instead of sorting the full list
+        domain_list = heapq.nlargest(15, domain_list, key=lambda x: x['total_visits'])
         
         # Get top URLs overall
         top_urls_overall = [
@@ -620,6 +653,10 @@ def generate_browsing_analytics_tool(output_file: str = "../../data/browsing_ana
             for query, count in search_queries.most_common(10)
         ]
         
+        # Totals for the percentage columns, computed once rather than per row
+        total_domain_visits = sum(stats['total_visits'] for stats in domain_stats.values())
+        total_category_visits = sum(category_stats.values())
+        
         # Create analytics output optimized for pie charts and frequency analysis
         analytics = {
             'domain_frequency': [
@@ -627,15 +664,15 @@ def generate_browsing_analytics_tool(output_file: str = "../../data/browsing_ana
                     'domain': domain['domain'],
                     'visits': domain['total_visits'],
                     'category': domain['category'],
-                    'percentage': round((domain['total_visits'] / sum(d['total_visits'] for d in domain_list)) * 100, 1)
+                    'percentage': round((domain['total_visits'] / total_domain_visits) * 100, 1)
                 }
-                for domain in domain_list[:15]  # Top 15 for pie chart
+                for domain in domain_list  # Top 15 for pie chart
             ],
             'category_breakdown': [
                 {
                     'category': category,
                     'visits': visits,
-                    'percentage': round((visits / sum(category_stats.values())) * 100, 1)
+                    'percentage': round((visits / total_category_visits) * 100, 1)
                 }
                 for category, visits in sorted(category_stats.items(), key=lambda x: x[1], reverse=True)
             ]
@@ -645,14 +682,15 @@ def generate_browsing_analytics_tool(output_file: str = "../../data/browsing_ana
         if output_file and os.path.dirname(output_file):
             os.makedirs(os.path.dirname(output_file), exist_ok=True)
         
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(analytics, f, indent=2, ensure_ascii=False)
+        analytics_json = orjson.dumps(analytics, option=orjson.OPT_INDENT_2)
+        with open(output_file, 'wb') as f:
+            f.write(analytics_json)
         
         # Return JSON format only
-        return json.dumps(analytics, indent=2, ensure_ascii=False)
+        return analytics_json.decode()
         
     except Exception as e:
-        return json.dumps({"error": f"Error generating browsing analytics: {str(e)}"}, indent=2)
+        return orjson.dumps({"error": f"Error generating browsing analytics: {str(e)}"}, option=orjson.OPT_INDENT_2).decode()
 
 def extract_title_from_content(content: str, url: str) -> str:
     """Extract meaningful title from page content or URL."""
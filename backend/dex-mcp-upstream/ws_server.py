@@ -1,5 +1,5 @@
 import asyncio
-import json
+import orjson
 import logging
 import websockets
 from websockets.server import WebSocketServerProtocol
@@ -8,6 +8,27 @@ from context import Context
 logger = logging.getLogger(__name__)
 
 
+def parse_binary_frame(frame: bytes) -> dict:
+    """Split a binary frame from the extension into its JSON header and attachment.
+
+    Binary frames are a 4-byte big-endian header length, the JSON response
+    header, then raw attachment bytes (e.g. a PNG screenshot) sent without
+    base64 encoding.
+
+    Raises ValueError if the frame is truncated or its header is not a JSON object.
+    """
+    if len(frame) < 4:
+        raise ValueError(f"binary frame too short for a header length ({len(frame)} bytes)")
+    header_length = int.from_bytes(frame[:4], "big")
+    if len(frame) < 4 + header_length:
+        raise ValueError(f"binary frame truncated: header needs {header_length} bytes, got {len(frame) - 4}")
+    data = orjson.loads(frame[4:4 + header_length])
+    if not isinstance(data, dict):
+        raise ValueError(f"binary frame header must be a JSON object, got {type(data).__name__}")
+    data["attachment"] = frame[4 + header_length:]
+    return data
+
+
 async def handle_websocket_connection(websocket: WebSocketServerProtocol, context: Context):
     """Handle incoming WebSocket connection from browser extension."""
     logger.info("Browser extension connected")
@@ -16,7 +37,18 @@ async def handle_websocket_connection(websocket: WebSocketServerProtocol, contex
     try:
         async for message in websocket:
             try:
-                data = json.loads(message)
+                if isinstance(message, bytes):
+                    data = parse_binary_frame(message)
+                else:
+                    data = orjson.loads(message)
+
+                # The extension advertises optional protocol features, e.g.
+                # {"type": "hello", "payload": {"capabilities": ["batch"]}}
+                if data.get("type") == "hello":
+                    capabilities = data.get("payload", {}).get("capabilities", [])
+                    context.set_capabilities(capabilities)
+                    logger.info("Browser extension capabilities: %s", capabilities)
+                    continue
 
                 # Handle debug log messages separately
                 if data.get("type") == "debug_log":
@@ -25,29 +57,38 @@ async def handle_websocket_connection(websocket: WebSocketServerProtocol, contex
                     continue  # Skip normal handling
 
                 context.handle_response(data)
-            except json.JSONDecodeError:
-                logger.error(f"Invalid JSON received: {message}")
+            except orjson.JSONDecodeError:
+                if isinstance(message, bytes):
+                    # Don't dump a multi-megabyte screenshot into the log
+                    logger.error("Invalid binary frame header received (%d bytes)", len(message))
+                else:
+                    logger.error("Invalid JSON received: %s", message)
             except Exception as e:
-                logger.error(f"Error handling message: {e}")
+                if isinstance(message, bytes):
+                    logger.error("Error handling binary frame (%d bytes): %s", len(message), e)
+                else:
+                    logger.error("Error handling message: %s", e)
                 
     except websockets.exceptions.ConnectionClosed:
         logger.info("Browser extension disconnected")
     except Exception as e:
-        logger.error(f"WebSocket error: {e}")
+        logger.error("WebSocket error: %s", e)
     finally:
-        if context.has_ws() and context._ws == websocket:
-            context._ws = None
+        context.clear_ws(websocket)
 
 
 async def start_websocket_server(context: Context, host: str = "127.0.0.1", port: int = 8765):
     """Start the WebSocket server for browser extension connections."""
-    logger.info(f"Starting WebSocket server on {host}:{port}")
+    logger.info("Starting WebSocket server on %s:%s", host, port)
     
+    # Disable per-message deflate: screenshots and DOM dumps are large and
+    # compressing every frame costs more CPU than it saves on localhost.
     server = await websockets.serve(
         lambda ws: handle_websocket_connection(ws, context),
         host,
-        port
+        port,
+        compression=None
     )
     
-    logger.info(f"WebSocket server listening on ws://{host}:{port}")
+    logger.info("WebSocket server listening on ws://%s:%s", host, port)
     return server 
\ No newline at end of file